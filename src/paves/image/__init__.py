@@ -5,6 +5,7 @@ models and/or visualisation.`
 
 import functools
 import itertools
+import weakref
 from typing import (
     Any,
     Callable,
@@ -17,22 +18,81 @@ from typing import (
     cast,
 )
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageColor, ImageDraw, ImageFont
 from playa.page import ContentObject, Page, Annotation
 from playa.structure import Element
 from playa.utils import Rect
 
 from paves.image.converters import convert
 from paves.image.poppler import popple
-from paves.image.pdfium import pdfium
+from paves.image.pdfium import pdfium, pdfium_batch, pdfium_cache_clear
+
+__all__ = [
+    "convert",
+    "popple",
+    "pdfium",
+    "pdfium_batch",
+    "pdfium_cache_clear",
+    "show",
+    "show_cache_clear",
+    "box",
+    "mark",
+]
+
+
+SHOW_CACHE_SIZE = 4
+"""Number of rendered pages kept by `show` for each document."""
+_SHOWN: Dict[int, Dict[Tuple[int, int], Image.Image]] = {}
+"""Pages rendered by `show`, keyed by `id` of the document."""
 
-__all__ = ["convert", "popple", "pdfium", "show", "box", "mark"]
+
+def _convert_page(page: Page, dpi: int) -> Image.Image:
+    """Render just one page, without leaving the converter suspended
+    (and holding the page open) afterwards."""
+    images = convert(page, dpi=dpi)
+    try:
+        return next(images)
+    finally:
+        images.close()
+
+
+def _show_page(page: Page, dpi: int) -> Image.Image:
+    doc = page.doc
+    key = (page.page_idx, dpi)
+    shown = _SHOWN.get(id(doc))
+    if shown is None:
+        image = _convert_page(page, dpi)
+        # Only after rendering, so that the renderer gets imported
+        # (and can set up its own cleanup at exit) first
+        shown = _SHOWN[id(doc)] = {}
+        weakref.finalize(doc, _SHOWN.pop, id(doc), None)
+    else:
+        cached = shown.pop(key, None)
+        if cached is None:
+            cached = _convert_page(page, dpi)
+            if len(shown) >= SHOW_CACHE_SIZE:
+                # Forget the least recently shown page
+                del shown[next(iter(shown))]
+        image = cached
+    # Most recently shown pages go at the end
+    shown[key] = image
+    return image
 
 
 def show(page: Page, dpi: int = 72) -> Image.Image:
-    """Show a single page with some reasonable defaults."""
+    """Show a single page with some reasonable defaults.
+
+    The last few (`SHOW_CACHE_SIZE`) pages shown in each document are
+    cached, so drawing on the same page repeatedly (as `box` and
+    `mark` do) won't render it again.  These images are kept until
+    the document is closed and garbage collected, or until
+    `show_cache_clear` is called.  You get a copy of the cached image,
+    which you are free to modify.
+    """
     try:
-        return next(convert(page, dpi=dpi))
+        if isinstance(page, Page):
+            return _show_page(page, dpi).copy()
+        return _convert_page(page, dpi)
     except NotImplementedError as e:
         raise ValueError(
             f"Can't call show() on a {type(page).__name__}, "
@@ -40,6 +100,12 @@ def show(page: Page, dpi: int = 72) -> Image.Image:
         ) from e
 
 
+def show_cache_clear() -> None:
+    """Forget about all pages rendered by `show`, freeing their memory."""
+    for shown in _SHOWN.values():
+        shown.clear()
+
+
 class HasBbox(Protocol):
     bbox: Rect
 
@@ -104,6 +170,7 @@ def get_label_element(obj: Element) -> str:
     return obj.type
 
 
+@functools.singledispatch
 def _make_boxes(
     obj: Union[
         Annotation,
@@ -115,19 +182,54 @@ def _make_boxes(
     ],
 ) -> Iterable[Union[Boxable, None]]:
     """Put a box into a list of boxes if necessary."""
-    # Is it a single Rect? (mypy is incapable of understanding the
-    # runtime check here so we need the cast among other things)
-    if isinstance(obj, tuple):
-        if len(obj) == 4 and all(isinstance(x, (int, float)) for x in obj):
-            return [cast(Rect, obj)]
-        # This shouldn't be necessary... but mypy needs it
-        return list(obj)
-    if isinstance(obj, (Annotation, ContentObject, Element)):
-        return [obj]
     if hasattr(obj, "bbox"):
         # Ugh, we have to cast
         return [cast(HasBbox, obj)]
-    return obj
+    return cast(Iterable[Union[Boxable, None]], obj)
+
+
+@_make_boxes.register(tuple)
+def _make_boxes_tuple(obj: tuple) -> Iterable[Union[Boxable, None]]:
+    # Is it a single Rect? (mypy is incapable of understanding the
+    # runtime check here so we need the cast among other things)
+    # Unrolled, as a tuple of objects is rejected on the first one
+    if (
+        len(obj) == 4
+        and isinstance(obj[0], (int, float))
+        and isinstance(obj[1], (int, float))
+        and isinstance(obj[2], (int, float))
+        and isinstance(obj[3], (int, float))
+    ):
+        return [cast(Rect, obj)]
+    # This shouldn't be necessary... but mypy needs it
+    return list(obj)
+
+
+@_make_boxes.register(Annotation)
+@_make_boxes.register(ContentObject)
+@_make_boxes.register(Element)
+def _make_boxes_object(
+    obj: Union[Annotation, ContentObject, Element],
+) -> Iterable[Union[Boxable, None]]:
+    return [obj]
+
+
+def _per_type(func: Callable[[Boxable], Any]) -> Callable[[Boxable], Any]:
+    """Look up the implementation of a `singledispatch` function only
+    once per type, as its own lookup is slow compared to the function."""
+    dispatch = getattr(func, "dispatch", None)
+    if dispatch is None:
+        return func
+    impls: Dict[type, Callable[[Boxable], Any]] = {}
+
+    def call(obj: Boxable) -> Any:
+        cls = obj.__class__
+        impl = impls.get(cls)
+        if impl is None:
+            impl = impls[cls] = dispatch(cls)
+        return impl(obj)
+
+    return call
 
 
 def _getpage(
@@ -181,13 +283,15 @@ def pillow_color(color: Color) -> PillowColor:
 @functools.singledispatch
 def color_maker(spec: Colors, default: Color = "red") -> ColorMaker:
     """Create a function that makes colors."""
-    return lambda _: pillow_color(default)
+    color = pillow_color(default)
+    return lambda _: color
 
 
 @color_maker.register(str)
 @color_maker.register(tuple)
 def _color_maker_string(spec: Color, default: Color = "red") -> ColorMaker:
-    return lambda _: pillow_color(spec)
+    color = pillow_color(spec)
+    return lambda _: color
 
 
 @color_maker.register(dict)
@@ -214,6 +318,24 @@ def _color_maker_list(spec: List[Color], default: Color = "UNUSED") -> ColorMake
     return maker
 
 
+@functools.lru_cache(maxsize=32)
+def _default_font(size: float) -> Union[ImageFont.FreeTypeFont, ImageFont.ImageFont]:
+    return ImageFont.load_default(size)
+
+
+# There are usually only a few distinct labels
+@functools.lru_cache(maxsize=256)
+def _text_bbox(
+    font: Union[ImageFont.FreeTypeFont, ImageFont.ImageFont], text: str
+) -> Tuple[float, float, float, float]:
+    return font.getbbox(text)
+
+
+def _with_alpha(color: PillowColor, alpha: int) -> Tuple[int, int, int, int]:
+    r, g, b = ImageColor.getrgb(color)[:3] if isinstance(color, str) else color
+    return (r, g, b, alpha)
+
+
 def box(
     objs: Union[
         Boxable,
@@ -233,35 +355,42 @@ def box(
     page: Union[Page, None] = None,
 ) -> Union[Image.Image, None]:
     """Draw boxes around things in a page of a PDF."""
-    draw: ImageDraw.ImageDraw
+    draw: Union[ImageDraw.ImageDraw, None] = None
     scale = dpi / 72
-    font = ImageFont.load_default(label_size * scale)
+    font = _default_font(label_size * scale)
     label_margin *= scale
     make_color = color_maker(color)
+    labelfunc = _per_type(labelfunc)
+    boxfunc = _per_type(boxfunc)
     image_page: Union[Page, None] = None
     for obj in _make_boxes(objs):
         if obj is None:
             continue
+        # Stop at the first object on a different page (pages compare
+        # by identity, and objects without one are on the same page)
         if image_page is not None:
-            if hasattr(obj, "page"):
-                if cast(HasPage, obj).page != image_page:
-                    break
+            if getattr(obj, "page", image_page) is not image_page:
+                break
         if image is None:
             image_page = _getpage(obj, page)
             image = show(image_page, dpi)
+        if draw is None:
+            draw = ImageDraw.ImageDraw(image)
         try:
             box = boxfunc(obj)
             if box is None:  # it has no box
                 continue
-            left, top, right, bottom = (x * scale for x in box)
+            if scale == 1:  # the usual case, no need to scale
+                left, top, right, bottom = box
+            else:
+                left, top, right, bottom = (x * scale for x in box)
         except ValueError:  # it has no content and no box
             continue
-        draw = ImageDraw.ImageDraw(image)
         text = str(labelfunc(obj))
         obj_color = make_color(text)
         draw.rectangle((left, top, right, bottom), outline=obj_color)
         if label:
-            tl, tt, tr, tb = font.getbbox(text)
+            tl, tt, tr, tb = _text_bbox(font, text)
             label_box = (
                 left,
                 top - tb - label_margin * 2,
@@ -303,47 +432,52 @@ def mark(
     page: Union[Page, None] = None,
 ) -> Union[Image.Image, None]:
     """Highlight things in a page of a PDF."""
+    # The alpha channel of the overlay is the opacity of the highlights
     overlay: Union[Image.Image, None] = None
-    mask: Union[Image.Image, None] = None
-    draw: ImageDraw.ImageDraw
+    draw: Union[ImageDraw.ImageDraw, None] = None
     scale = dpi / 72
-    font = ImageFont.load_default(label_size * scale)
-    alpha = min(255, int(transparency * 255))
+    font = _default_font(label_size * scale)
+    alpha = 255 - min(255, int(transparency * 255))
     label_margin *= scale
     make_color = color_maker(color)
+    labelfunc = _per_type(labelfunc)
+    boxfunc = _per_type(boxfunc)
+
+    @functools.lru_cache(maxsize=None)
+    def make_rgba(text: str) -> Tuple[int, int, int, int]:
+        return _with_alpha(make_color(text), alpha)
+
     image_page: Union[Page, None] = None
     for obj in _make_boxes(objs):
         if obj is None:
             continue
+        # Stop at the first object on a different page (pages compare
+        # by identity, and objects without one are on the same page)
         if image_page is not None:
-            if hasattr(obj, "page"):
-                if cast(HasPage, obj).page != image_page:
-                    break
+            if getattr(obj, "page", image_page) is not image_page:
+                break
         if image is None:
             image_page = _getpage(obj, page)
             image = show(image_page, dpi)
-        if overlay is None:
-            overlay = Image.new("RGB", image.size)
-        if mask is None:
-            mask = Image.new("L", image.size, 255)
+        if overlay is None or draw is None:
+            overlay = Image.new("RGBA", image.size)
+            draw = ImageDraw.ImageDraw(overlay)
         try:
             box = boxfunc(obj)
             if box is None:  # it has no box
                 continue
-            left, top, right, bottom = (x * scale for x in box)
+            if scale == 1:  # the usual case, no need to scale
+                left, top, right, bottom = box
+            else:
+                left, top, right, bottom = (x * scale for x in box)
         except ValueError:  # it has no content and no box
             continue
-        draw = ImageDraw.ImageDraw(overlay)
         text = str(labelfunc(obj))
-        obj_color = make_color(text)
-        draw.rectangle((left, top, right, bottom), fill=obj_color)
-        mask_draw = ImageDraw.ImageDraw(mask)
-        mask_draw.rectangle((left, top, right, bottom), fill=alpha)
-        if outline:
-            draw.rectangle((left, top, right, bottom), outline="black")
-            mask_draw.rectangle((left, top, right, bottom), outline=0)
+        obj_color = make_rgba(text)
+        edge_color = (0, 0, 0, 255) if outline else obj_color
+        draw.rectangle((left, top, right, bottom), fill=obj_color, outline=edge_color)
         if label:
-            tl, tt, tr, tb = font.getbbox(text)
+            tl, tt, tr, tb = _text_bbox(font, text)
             label_box = (
                 left,
                 top - tb - label_margin * 2,
@@ -352,34 +486,15 @@ def mark(
             )
             draw.rectangle(
                 label_box,
-                outline=obj_color,
+                outline=edge_color,
                 fill=obj_color,
             )
-            mask_draw.rectangle(
-                label_box,
-                fill=alpha,
-            )
             if outline:
-                draw.rectangle(
-                    label_box,
-                    outline="black",
-                )
-                mask_draw.rectangle(
-                    label_box,
-                    outline=0,
-                )
                 draw.text(
                     xy=(left + label_margin, top - label_margin),
                     text=text,
                     font=font,
-                    fill="black",
-                    anchor="ld",
-                )
-                mask_draw.text(
-                    xy=(left + label_margin, top - label_margin),
-                    text=text,
-                    font=font,
-                    fill=0,
+                    fill=(0, 0, 0, 255),
                     anchor="ld",
                 )
             else:
@@ -387,12 +502,17 @@ def mark(
                     xy=(left + label_margin, top - label_margin),
                     text=text,
                     font=font,
-                    fill="white",
+                    fill=(255, 255, 255, alpha),
                     anchor="ld",
                 )
     if image is None:
         return None
-    if overlay is not None and mask is not None:
-        return Image.composite(image, overlay, mask)
-    else:
-        return image
+    marked = image.copy()
+    if overlay is not None:
+        # Only blend the part of the image that actually got marked,
+        # directly into a copy of it
+        bbox = overlay.getbbox()
+        if bbox is not None:
+            region = overlay.crop(bbox)
+            marked.paste(region, bbox, region)
+    return marked
@@ -2,8 +2,20 @@
 Common interface for image converters.
 """
 
+import os
+import weakref
 from os import PathLike
-from typing import Callable, Iterator, List, Protocol, Tuple, Union
+from typing import (
+    Callable,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    Protocol,
+    Tuple,
+    TypeVar,
+    Union,
+)
 from playa import Document, Page, PageList
 from PIL import Image
 
@@ -25,14 +37,51 @@ class Converter(Protocol):
     __name__: str
 
 
+ConverterT = TypeVar("ConverterT", bound=Converter)
 CONVERTERS: List[Tuple[int, Converter]] = []
-
-
-def converter(*, priority: int) -> Callable[[Converter], Converter]:
-    """Decorator to register converter functions with priorities."""
-
-    def register(func: Converter) -> Converter:
+_SELECTED: Union[Converter, None] = None
+"""First converter found to work, so we don't have to probe them again."""
+
+
+_DOC_FILES: Dict[int, str] = {}
+"""Absolute paths of the files documents came from, keyed by `id` of
+the document."""
+
+
+def document_file(doc: Document) -> Union[str, None]:
+    """Get the file a document was opened from, if it is still there.
+
+    The path is made absolute the first time we see the document, and
+    is only returned if it is still the very same file that the
+    document has open, so that we never render some other file."""
+    fp = doc._fp
+    name = getattr(fp, "name", None)
+    if fp is None or not isinstance(name, str) or name.startswith("<"):
+        return None
+    path = _DOC_FILES.get(id(doc))
+    if path is None:
+        path = _DOC_FILES[id(doc)] = os.path.abspath(name)
+        weakref.finalize(doc, _DOC_FILES.pop, id(doc), None)
+    try:
+        opened = os.fstat(fp.fileno())
+        found = os.stat(path)
+    except (OSError, ValueError):  # gone, or closed
+        return None
+    if (opened.st_dev, opened.st_ino) != (found.st_dev, found.st_ino):
+        return None
+    return path
+
+
+def converter(*, priority: int) -> Callable[[ConverterT], ConverterT]:
+    """Decorator to register converter functions with priorities.
+
+    The decorated function keeps its own signature, so it can take
+    extra keyword arguments beyond those of `Converter`."""
+
+    def register(func: ConverterT) -> ConverterT:
+        global _SELECTED
         CONVERTERS.append((priority, func))
+        _SELECTED = None
         # We don't care about the inefficiency of this as there are
         # only ever going to be a few of them
         CONVERTERS.sort()
@@ -47,7 +96,7 @@ def convert(
     dpi: int = 0,
     width: int = 0,
     height: int = 0,
-) -> Iterator[Image.Image]:
+) -> Generator[Image.Image, None, None]:
     """Convert a PDF to images.
 
     Args:
@@ -65,15 +114,26 @@ def convert(
         NotInstalledError: If no renderer is available
 
     """
+    global _SELECTED
+    if _SELECTED is not None:
+        yield from _SELECTED(pdf, dpi=dpi, width=width, height=height)
+        return
     for _, convert in CONVERTERS:
+        images = convert(pdf, dpi=dpi, width=width, height=height)
+        # Converters complain about not being installed before they
+        # produce anything, so only fall back if that happens
         try:
-            for img in convert(pdf, dpi=dpi, width=width, height=height):
-                yield img
-            break
+            img = next(images)
+        except StopIteration:
+            _SELECTED = convert
+            return
         except NotInstalledError:
             continue
-    else:
-        raise NotInstalledError(
-            "No converters available, tried: %s"
-            % (", ".join(m.__name__ for _, m in CONVERTERS))
-        )
+        _SELECTED = convert
+        yield img
+        yield from images
+        return
+    raise NotInstalledError(
+        "No converters available, tried: %s"
+        % (", ".join(m.__name__ for _, m in CONVERTERS))
+    )
@@ -2,13 +2,24 @@
 Convert PDFs to images using pypdfium2.
 """
 
-import contextlib
+import atexit
+import ctypes
 import functools
+import math
+import os
+import sys
+import weakref
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from io import BytesIO
 from os import PathLike
 from typing import (
     TYPE_CHECKING,
+    Any,
+    Deque,
+    Dict,
     Iterator,
+    List,
     Tuple,
     Union,
 )
@@ -17,16 +28,29 @@ from PIL import Image
 from playa.document import Document, PageList
 from playa.page import Page
 
-from paves.image.converters import converter
+from paves.image.converters import converter, document_file
 from paves.exceptions import NotInstalledError
 
 if TYPE_CHECKING:
+    import numpy
     import pypdfium2  # types: ignore
 
 
-@functools.singledispatch
 def _get_pdfium_pages(
     pdf: Union[str, PathLike, Document, Page, PageList],
+) -> Iterator[Tuple[int, "pypdfium2.PdfPage"]]:
+    # Not singledispatch, as that is slower for so few types
+    if isinstance(pdf, Document):
+        return _get_pdfium_pages_doc(pdf)
+    elif isinstance(pdf, Page):
+        return _get_pdfium_pages_page(pdf)
+    elif isinstance(pdf, PageList):
+        return _get_pdfium_pages_pagelist(pdf)
+    return _get_pdfium_pages_path(pdf)
+
+
+def _get_pdfium_pages_path(
+    pdf: Union[str, PathLike],
 ) -> Iterator[Tuple[int, "pypdfium2.PdfPage"]]:
     import pypdfium2
 
@@ -37,51 +61,312 @@ def _get_pdfium_pages(
     doc.close()
 
 
-@contextlib.contextmanager
-def _get_pdfium_doc(pdf: Document) -> Iterator["pypdfium2.PdfDocument"]:
+_PDFIUM_DOCS: Dict[int, "pypdfium2.PdfDocument"] = {}
+"""pypdfium2 documents opened for PLAYA documents, by `id` of the latter."""
+
+
+def _get_pdfium_doc(pdf: Document) -> "pypdfium2.PdfDocument":
+    """Get a pypdfium2 document for a PLAYA document, opening it only
+    once, so that rendering several pages or page lists from the same
+    document does not parse it again each time."""
     import pypdfium2
 
-    if pdf._fp is None:
+    doc = _PDFIUM_DOCS.get(id(pdf))
+    if doc is not None:
+        return doc
+    path = document_file(pdf)
+    if path is not None:
+        # Let pdfium read the file itself rather than through Python
+        doc = pypdfium2.PdfDocument(path)
+    elif isinstance(pdf.buffer, bytes):
+        # pdfium can use this directly without copying it
+        doc = pypdfium2.PdfDocument(pdf.buffer)
+    elif pdf._fp is None:
         # Yes, you can actually wrap a BytesIO around an mmap!
-        with BytesIO(pdf.buffer) as fp:
-            doc = pypdfium2.PdfDocument(fp)
-            yield doc
-            doc.close()
+        doc = pypdfium2.PdfDocument(BytesIO(pdf.buffer))
     else:
         doc = pypdfium2.PdfDocument(pdf._fp)
-        yield doc
+    _PDFIUM_DOCS[id(pdf)] = doc
+    weakref.finalize(pdf, _close_pdfium_doc, id(pdf))
+    _close_at_exit()
+    return doc
+
+
+def _close_pdfium_doc(doc_id: int) -> None:
+    doc = _PDFIUM_DOCS.pop(doc_id, None)
+    if doc is not None:
         doc.close()
 
 
-@_get_pdfium_pages.register(Document)
+@functools.lru_cache(maxsize=None)
+def _close_at_exit() -> None:
+    """Close cached documents before pypdfium2 complains about them
+    at exit (this runs first, as it is registered after importing
+    pypdfium2)."""
+    atexit.register(pdfium_cache_clear)
+
+
+def pdfium_cache_clear() -> None:
+    """Close all pypdfium2 documents opened for PLAYA documents.
+
+    These are kept open until the PLAYA document is garbage collected,
+    so that rendering its pages again doesn't parse it again.
+    """
+    for doc_id in list(_PDFIUM_DOCS):
+        _close_pdfium_doc(doc_id)
+
+
 def _get_pdfium_pages_doc(pdf: Document) -> Iterator[Tuple[int, "pypdfium2.PdfPage"]]:
-    with _get_pdfium_doc(pdf) as doc:
-        for idx, page in enumerate(doc):
-            yield idx, page
-            page.close()
+    doc = _get_pdfium_doc(pdf)
+    for idx, page in enumerate(doc):
+        yield idx, page
+        page.close()
 
 
-@_get_pdfium_pages.register(Page)
 def _get_pdfium_pages_page(page: Page) -> Iterator[Tuple[int, "pypdfium2.PdfPage"]]:
     pdf = page.doc
     assert pdf is not None
-    with _get_pdfium_doc(pdf) as doc:
-        pdfium_page = doc[page.page_idx]
-        yield page.page_idx, pdfium_page
-        pdfium_page.close()
+    pdfium_page = _get_pdfium_doc(pdf)[page.page_idx]
+    yield page.page_idx, pdfium_page
+    pdfium_page.close()
 
 
-@_get_pdfium_pages.register(PageList)
 def _get_pdfium_pages_pagelist(
     pages: PageList,
 ) -> Iterator[Tuple[int, "pypdfium2.PdfPage"]]:
     pdf = pages.doc
     assert pdf is not None
-    with _get_pdfium_doc(pdf) as doc:
-        for page in pages:
-            pdfium_page = doc[page.page_idx]
-            yield page.page_idx, pdfium_page
-            pdfium_page.close()
+    doc = _get_pdfium_doc(pdf)
+    for page in pages:
+        pdfium_page = doc[page.page_idx]
+        yield page.page_idx, pdfium_page
+        pdfium_page.close()
+
+
+TILE_THRESHOLD = 64 << 20
+"""Size in bytes above which pages are rendered in horizontal strips."""
+STRIP_SIZE = 16 << 20
+"""Approximate size in bytes of strips for rendering large pages."""
+
+
+def _render_scaled(page: "pypdfium2.PdfPage", scale: float) -> Image.Image:
+    width = math.ceil(page.get_width() * scale)
+    height = math.ceil(page.get_height() * scale)
+    if width * height * 3 > TILE_THRESHOLD:
+        return _render_tiled(page, scale, width, height)
+    # Have pdfium produce RGB rather than BGR, so that Pillow can copy
+    # it as-is without swapping channels
+    bitmap = page.render(scale=scale, rev_byteorder=True)
+    img = bitmap.to_pil()
+    bitmap.close()
+    return img
+
+
+def _render_tiled(
+    page: "pypdfium2.PdfPage", scale: float, width: int, height: int
+) -> Image.Image:
+    """Render a large page one strip at a time, so that we never have
+    a full-page bitmap in addition to the full-page image."""
+    img = Image.new("RGB", (width, height))
+    strip_height = max(1, STRIP_SIZE // (width * 3))
+    for top in range(0, height, strip_height):
+        bottom = min(height, top + strip_height)
+        # pypdfium2 takes the crop in points and rounds it up to
+        # pixels, so nudge it to land exactly on the pixel boundary
+        crop = (
+            0,
+            (height - bottom - 0.5) / scale if bottom < height else 0,
+            0,
+            (top - 0.5) / scale if top else 0,
+        )
+        bitmap = page.render(scale=scale, crop=crop, rev_byteorder=True)
+        img.paste(bitmap.to_pil(), (0, top))
+        bitmap.close()
+    return img
+
+
+def _fit_scale(size: int, page_size: float) -> float:
+    """Get the scale at which pdfium renders `page_size` points to
+    exactly `size` pixels (it rounds up, and `size / page_size` may
+    not round-trip through floating point)."""
+    scale = size / page_size
+    while math.ceil(page_size * scale) > size:
+        scale *= 1 - sys.float_info.epsilon
+    return scale
+
+
+def _render_page(
+    page: "pypdfium2.PdfPage",
+    dpi: int,
+    width: int,
+    height: int,
+    exact_aspect: bool = True,
+) -> Image.Image:
+    """Render a single pypdfium2 page to a Pillow image."""
+    if width == 0 and height == 0:
+        scale = (dpi or 72) / 72
+        return _render_scaled(page, scale)
+    if width and height:
+        # pypdfium2 doesn't appear to allow non-1:1 aspect ratio, so
+        # render to one side and resize the other
+        if exact_aspect:
+            # Scale to longest side and resize down
+            scale = max(
+                _fit_scale(width, page.get_width()),
+                _fit_scale(height, page.get_height()),
+            )
+        else:
+            # Scale to shortest side (fewer pixels to render) and resize up
+            scale = min(
+                _fit_scale(width, page.get_width()),
+                _fit_scale(height, page.get_height()),
+            )
+        img = _render_scaled(page, scale)
+        if img.size == (width, height):
+            return img
+        return img.resize(size=(width, height), resample=Image.Resampling.BICUBIC)
+    elif width:
+        scale = _fit_scale(width, page.get_width())
+    else:
+        scale = _fit_scale(height, page.get_height())
+    return _render_scaled(page, scale)
+
+
+@functools.singledispatch
+def _get_pdfium_source(
+    pdf: Union[str, PathLike, Document, Page, PageList],
+) -> Union[Tuple[Union[str, bytes], List[int]], None]:
+    """Get something that a worker process can open, along with the
+    indices of the pages to render, or None if this isn't worth it."""
+    return None
+
+
+@_get_pdfium_source.register(str)
+@_get_pdfium_source.register(PathLike)
+def _get_pdfium_source_path(
+    pdf: Union[str, PathLike],
+) -> Union[Tuple[Union[str, bytes], List[int]], None]:
+    import pypdfium2
+
+    path = os.fspath(pdf)
+    doc = pypdfium2.PdfDocument(path)
+    npages = len(doc)
+    doc.close()
+    return path, list(range(npages))
+
+
+def _get_doc_source(pdf: Document) -> Union[str, bytes]:
+    name = document_file(pdf)
+    if name is not None:
+        return name
+    # Sadly this has to get pickled (once per worker)
+    return bytes(pdf.buffer)
+
+
+@_get_pdfium_source.register(Document)
+def _get_pdfium_source_doc(
+    pdf: Document,
+) -> Union[Tuple[Union[str, bytes], List[int]], None]:
+    return _get_doc_source(pdf), list(range(len(pdf.pages)))
+
+
+@_get_pdfium_source.register(PageList)
+def _get_pdfium_source_pagelist(
+    pages: PageList,
+) -> Union[Tuple[Union[str, bytes], List[int]], None]:
+    return _get_doc_source(pages.doc), [page.page_idx for page in pages]
+
+
+# Document opened once in each worker process by _init_worker
+_WORKER_DOC: Any = None
+
+
+def _init_worker(source: Union[str, bytes]) -> None:
+    """Open the document in a worker process."""
+    import pypdfium2
+
+    global _WORKER_DOC
+    _WORKER_DOC = pypdfium2.PdfDocument(source)
+
+
+def _render_pages(
+    page_indices: List[int],
+    dpi: int,
+    width: int,
+    height: int,
+    exact_aspect: bool,
+) -> List[Tuple[int, float, float, str, Tuple[int, int], bytes]]:
+    """Render some pages in a worker process.
+
+    Pillow images and pdfium handles are not picklable (or not
+    efficiently), so we send back the raw pixels."""
+    rendered = []
+    for idx in page_indices:
+        page = _WORKER_DOC[idx]
+        img = _render_page(page, dpi, width, height, exact_aspect)
+        rendered.append(
+            (
+                idx,
+                page.get_width(),
+                page.get_height(),
+                img.mode,
+                img.size,
+                img.tobytes(),
+            )
+        )
+        page.close()
+    return rendered
+
+
+def _pdfium_parallel(
+    source: Union[str, bytes],
+    page_indices: List[int],
+    *,
+    dpi: int,
+    width: int,
+    height: int,
+    exact_aspect: bool,
+    max_workers: int,
+    pages_per_worker: int,
+) -> Iterator[Image.Image]:
+    blocks = (
+        page_indices[start : start + pages_per_worker]
+        for start in range(0, len(page_indices), pages_per_worker)
+    )
+    # The source (possibly the whole PDF in memory) is sent to each
+    # worker once, and only page numbers are sent with each block
+    pool = ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_worker, initargs=(source,)
+    )
+    try:
+        # Don't get too far ahead of the caller, as the rendered
+        # pages are kept in memory until they are consumed
+        pending: Deque[Future] = deque()
+        for block in blocks:
+            pending.append(
+                pool.submit(_render_pages, block, dpi, width, height, exact_aspect)
+            )
+            if len(pending) < max_workers * 2:
+                continue
+            yield from _unpack_rendered(pending.popleft().result())
+        while pending:
+            yield from _unpack_rendered(pending.popleft().result())
+    finally:
+        # Not cancel_futures, which needs Python 3.9
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+
+def _unpack_rendered(
+    rendered: List[Tuple[int, float, float, str, Tuple[int, int], bytes]],
+) -> Iterator[Image.Image]:
+    for idx, page_width, page_height, mode, size, data in rendered:
+        img = Image.frombytes(mode, size, data)
+        img.info["page_index"] = idx
+        img.info["page_width"] = page_width
+        img.info["page_height"] = page_height
+        yield img
 
 
 @converter(priority=20)
@@ -91,14 +376,33 @@ def pdfium(
     dpi: int = 0,
     width: int = 0,
     height: int = 0,
+    exact_aspect: bool = True,
+    max_workers: int = 1,
+    pages_per_worker: int = 4,
 ) -> Iterator[Image.Image]:
     """Convert a PDF to images using PyPDFium2
 
+    Optionally, multiple pages can be rendered in parallel by a pool
+    of worker processes, each of which gets blocks of
+    `pages_per_worker` pages.  This is only worth it for large
+    documents, and, as with any use of `multiprocessing`, your main
+    module must be safely importable (e.g. with an `if __name__ ==
+    "__main__"` guard).
+
     Args:
         pdf: PLAYA-PDF document, page, pages, or path to a PDF.
         dpi: Render to this resolution (default is 72 dpi).
         width: Render to this width in pixels.
         height: Render to this height in pixels.
+        exact_aspect: If both `width` and `height` are given, render at
+            the larger of the two scales and shrink the other side
+            (the default).  If False, render at the smaller one and
+            stretch the other side, which is faster but blurrier.
+        max_workers: Number of worker processes to use for rendering
+            (default is 1, which renders everything in the current
+            process).
+        pages_per_worker: Number of pages to render at a time in each
+            worker process.
     Yields:
         Pillow `Image.Image` objects, one per page.  Page width and height are
         available in the `info` property of the images.
@@ -112,27 +416,125 @@ def pdfium(
         import pypdfium2  # noqa: F401
     except ImportError as e:
         raise NotInstalledError("PyPDFium2 does not seem to be installed") from e
+    if pages_per_worker < 1:
+        raise ValueError("`pages_per_worker` must be at least 1")
+    if max_workers > 1:
+        source = _get_pdfium_source(pdf)
+        if source is not None and len(source[1]) > pages_per_worker:
+            src, page_indices = source
+            yield from _pdfium_parallel(
+                src,
+                page_indices,
+                dpi=dpi,
+                width=width,
+                height=height,
+                exact_aspect=exact_aspect,
+                max_workers=max_workers,
+                pages_per_worker=pages_per_worker,
+            )
+            return
     for idx, page in _get_pdfium_pages(pdf):
-        page_width = page.get_width()
-        page_height = page.get_height()
-        if width == 0 and height == 0:
-            scale = (dpi or 72) / 72
-            img = page.render(scale=scale).to_pil()
-        else:
-            if width and height:
-                # Scale to longest side (since pypdfium2 doesn't
-                # appear to allow non-1:1 aspect ratio)
-                scale = max(width / page_width, height / page_height)
-                img = page.render(scale=scale).to_pil()
-                # Resize down to desired size
-                img = img.resize(size=(width, height))
-            elif width:
-                scale = width / page.get_width()
-                img = page.render(scale=scale).to_pil()
-            elif height:
-                scale = height / page.get_height()
-                img = page.render(scale=scale).to_pil()
+        img = _render_page(page, dpi, width, height, exact_aspect)
         img.info["page_index"] = idx
-        img.info["page_width"] = page_width
-        img.info["page_height"] = page_height
+        img.info["page_width"] = page.get_width()
+        img.info["page_height"] = page.get_height()
         yield img
+
+
+def _count_pages(pdf: Union[str, PathLike, Document, Page, PageList]) -> int:
+    import pypdfium2
+
+    if isinstance(pdf, Document):
+        return len(pdf.pages)
+    elif isinstance(pdf, Page):
+        return 1
+    elif isinstance(pdf, PageList):
+        return len(pdf)
+    doc = pypdfium2.PdfDocument(pdf)
+    npages = len(doc)
+    doc.close()
+    return npages
+
+
+def _render_into(page: "pypdfium2.PdfPage", scale: float, out: "numpy.ndarray") -> None:
+    """Have pdfium render a page directly into an (H, W, 3) array."""
+    import pypdfium2
+
+    height, width, _ = out.shape
+    buffer = (ctypes.c_ubyte * out.nbytes).from_buffer(out.data)
+    bitmap = page.render(
+        scale=scale,
+        rev_byteorder=True,
+        force_bitmap_format=pypdfium2.raw.FPDFBitmap_BGR,
+        bitmap_maker=functools.partial(
+            pypdfium2.PdfBitmap.new_native, buffer=buffer, stride=width * 3
+        ),
+    )
+    bitmap.close()
+
+
+def pdfium_batch(
+    pdf: Union[str, PathLike, Document, Page, PageList],
+    *,
+    dpi: int = 0,
+    width: int = 0,
+    height: int = 0,
+) -> "numpy.ndarray":
+    """Render pages of a PDF into a single NumPy array using PyPDFium2.
+
+    Pages are rendered directly into the array where possible, which
+    avoids creating an image for each page and then stacking them,
+    for instance to feed them to a model as a batch.
+
+    Args:
+        pdf: PLAYA-PDF document, page, pages, or path to a PDF.
+        dpi: Render to this resolution (default is 72 dpi).
+        width: Render to this width in pixels.
+        height: Render to this height in pixels.
+    Returns:
+        Array of 8-bit RGB pixels of shape `(pages, height, width, 3)`.
+    Raises:
+        ValueError: Invalid arguments (e.g. both `dpi` and
+            `width`/`height`), or pages that don't all render to the
+            same size (give both `width` and `height` in that case).
+        NotInstalledError: If PyPDFium2 or NumPy is not installed.
+    """
+    if dpi and (width or height):
+        raise ValueError("Cannot specify both `dpi` and `width` or `height`")
+    try:
+        import numpy
+    except ImportError as e:
+        raise NotInstalledError("NumPy does not seem to be installed") from e
+    try:
+        import pypdfium2  # noqa: F401
+    except ImportError as e:
+        raise NotInstalledError("PyPDFium2 does not seem to be installed") from e
+    out: Union[numpy.ndarray, None] = None
+    npages = _count_pages(pdf)
+    for idx, (_, page) in enumerate(_get_pdfium_pages(pdf)):
+        page_width, page_height = page.get_width(), page.get_height()
+        if width and height:
+            scale = min(_fit_scale(width, page_width), _fit_scale(height, page_height))
+        elif width:
+            scale = _fit_scale(width, page_width)
+        elif height:
+            scale = _fit_scale(height, page_height)
+        else:
+            scale = (dpi or 72) / 72
+        size = (math.ceil(page_height * scale), math.ceil(page_width * scale))
+        if out is None:
+            out = numpy.empty(
+                (npages, height or size[0], width or size[1], 3), dtype=numpy.uint8
+            )
+        if size == out.shape[1:3]:
+            _render_into(page, scale, out[idx])
+        elif width and height:
+            out[idx] = numpy.asarray(_render_page(page, dpi, width, height))
+        else:
+            raise ValueError(
+                "Page %d renders to %r, not %r (specify `width` and `height`)"
+                % (idx, size, out.shape[1:3])
+            )
+    if out is None:
+        return numpy.empty((0, height, width, 3), dtype=numpy.uint8)
+    return out
@@ -2,13 +2,22 @@
 Convert PDFs to images using poppler command-line tools.
 """
 
-import functools
+import math
+import mmap
+import operator
+import os
+import queue
 import shutil
 import subprocess
 import tempfile
+import threading
+import weakref
+from collections import deque
 from os import PathLike
-from pathlib import Path
 from typing import (
+    IO,
+    Deque,
+    Dict,
     Iterator,
     List,
     Tuple,
@@ -21,9 +30,10 @@ from playa.document import Document, PageList
 from playa.page import Page
 
 from paves.exceptions import NotInstalledError
-from paves.image.converters import converter
+from paves.image.converters import converter, document_file
 
 PATH_TO_POPPLER: Union[str, None] = shutil.which("pdftoppm")
+_POPPLER_OK: Union[bool, None] = None
 
 
 def make_poppler_args(dpi: int, width: int, height: int) -> List[str]:
@@ -42,116 +52,340 @@ def make_poppler_args(dpi: int, width: int, height: int) -> List[str]:
     return args
 
 
-@functools.singledispatch
-def _popple(pdf, tempdir: Path, args: List[str]) -> List[Tuple[int, float, float]]:
+PageSizes = List[Union[Tuple[int, float, float], None]]
+"""Indices and sizes of pages rendered by pdftoppm (None to skip a page)."""
+Buffer = Union[bytes, mmap.mmap]
+"""PDF data to send to pdftoppm on its standard input."""
+Commands = List[Tuple[List[str], Union[Buffer, None], PageSizes]]
+"""Arguments and input for pdftoppm along with the pages they render."""
+COALESCE_DENSITY = 0.3
+"""Render all pages between the first and last ones requested if at
+least this fraction of them were requested, rather than running
+pdftoppm once for each contiguous range."""
+Frame = Union[Image.Image, Exception, None]
+"""Image read from pdftoppm, or the reason we couldn't read one."""
+
+
+def _read_pnm(stream: IO[bytes]) -> Union[Image.Image, None]:
+    """Read a single binary PPM (or PGM) image from a stream of them,
+    returning None at the end of the stream."""
+    magic = stream.read(2)
+    if not magic:
+        return None
+    if magic not in (b"P6", b"P5"):
+        raise ValueError("Expected PPM or PGM from pdftoppm, got %r" % magic)
+    fields: List[int] = []
+    while len(fields) < 3:
+        c = stream.read(1)
+        if c == b"#":
+            stream.readline()
+            continue
+        if not c.isspace():
+            token = c
+            while True:
+                c = stream.read(1)
+                if not c or c.isspace():
+                    break
+                token += c
+            fields.append(int(token))
+        if not c:
+            raise ValueError("Truncated PPM header from pdftoppm")
+    # The single whitespace character after maxval has been consumed
+    width, height, maxval = fields
+    if maxval > 255:
+        raise ValueError("16-bit PPM is not supported")
+    mode = "RGB" if magic == b"P6" else "L"
+    nbytes = width * height * len(mode)
+    data = stream.read(nbytes)
+    if len(data) != nbytes:
+        raise ValueError("Truncated PPM data from pdftoppm")
+    return Image.frombytes(mode, (width, height), data)
+
+
+_MATERIALIZED: Dict[int, str] = {}
+"""Temporary files holding in-memory PDFs, keyed by `id` of the document."""
+
+
+def _forget(doc_id: int, path: str) -> None:
+    _MATERIALIZED.pop(doc_id, None)
+    try:
+        os.unlink(path)
+    except OSError:  # pragma: no cover
+        pass
+
+
+def _materialize(doc: Document) -> str:
+    """Get a file containing the PDF for pdftoppm to read.
+
+    If the document was opened from a file, this is just that file.
+    Otherwise it is written only once per document and is removed
+    when the document goes away (or when Python exits)."""
+    name = _source_file(doc)
+    if name is not None:
+        return name
+    doc_id = id(doc)
+    path = _MATERIALIZED.get(doc_id)
+    if path is not None:
+        return path
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as outfh:
+        outfh.write(doc.buffer)
+    path = _MATERIALIZED[doc_id] = outfh.name
+    weakref.finalize(doc, _forget, doc_id, path)
+    return path
+
+
+def _source_file(doc: Document) -> Union[str, None]:
+    """Get the file a document came from, or one it was written to."""
+    name = document_file(doc)
+    if name is not None:
+        return name
+    return _MATERIALIZED.get(id(doc))
+
+
+def _source(doc: Document) -> Tuple[str, Union[Buffer, None]]:
+    """Get the input argument for a single run of pdftoppm, along with
+    the data to send to its standard input, if any."""
+    name = _source_file(doc)
+    if name is not None:
+        return name, None
+    return "-", doc.buffer
+
+
+def _popple(
+    pdf: Union[str, PathLike, Document, Page, PageList],
+    args: List[str],
+    pieces: int = 1,
+) -> Commands:
+    # Not singledispatch, as that is slower for so few types
+    if isinstance(pdf, Document):
+        return _popple_doc(pdf, args, pieces)
+    elif isinstance(pdf, Page):
+        return _popple_page(pdf, args, pieces)
+    elif isinstance(pdf, PageList):
+        return _popple_pages(pdf, args, pieces)
+    elif isinstance(pdf, (str, PathLike)):
+        return _popple_path(pdf, args, pieces)
     raise NotImplementedError
 
 
-@_popple.register(str)
-@_popple.register(PathLike)
-def _popple_path(
-    pdf: Union[str, PathLike], tempdir: Path, args: List[str]
-) -> List[Tuple[int, float, float]]:
-    subprocess.run(
-        [
-            "pdftoppm",
-            *args,
-            str(pdf),
-            tempdir / "ppm",
-        ],
-        check=True,
-    )
+def _span_index(span: PageSizes, pos: int) -> int:
+    page = span[pos]
+    assert page is not None  # spans start and end with requested pages
+    return page[0]
+
+
+def _split_spans(spans: List[PageSizes], pieces: int) -> List[PageSizes]:
+    """Split up spans of pages into about `pieces` contiguous ranges so
+    that pdftoppm can render them in parallel."""
+    if pieces == 1:
+        return spans
+    # Every pdftoppm has to parse the whole PDF, so don't make more
+    # of them than we need to
+    span_size = math.ceil(sum(len(span) for span in spans) / pieces)
+    split: List[PageSizes] = []
+    for span in spans:
+        for start in range(0, len(span), span_size):
+            piece = span[start : start + span_size]
+            # Don't render skipped pages at the edges of the pieces
+            while piece and piece[0] is None:
+                del piece[0]
+            while piece and piece[-1] is None:
+                del piece[-1]
+            if piece:
+                split.append(piece)
+    return split
+
+
+def _commands(
+    args: List[str], pdfpdf: str, pdfdata: Union[Buffer, None], spans: List[PageSizes]
+) -> Commands:
+    return [
+        (
+            [
+                *args,
+                "-f",
+                str(_span_index(span, 0) + 1),
+                "-l",
+                str(_span_index(span, -1) + 1),
+                pdfpdf,
+            ],
+            pdfdata,
+            span,
+        )
+        for span in spans
+    ]
+
+
+def _popple_path(pdf: Union[str, PathLike], args: List[str], pieces: int) -> Commands:
     with playa.open(pdf) as doc:
-        return [(page.page_idx, page.width, page.height) for page in doc.pages]
-
-
-@_popple.register(Document)
-def _popple_doc(
-    pdf: Document, tempdir: Path, args: List[str]
-) -> List[Tuple[int, float, float]]:
-    pdfpdf = tempdir / "pdf.pdf"
-    # FIXME: This is... not great (can we popple in a pipeline please?)
-    with open(pdfpdf, "wb") as outfh:
-        outfh.write(pdf.buffer)
-    subprocess.run(
-        [
-            "pdftoppm",
-            *args,
-            str(pdfpdf),
-            tempdir / "ppm",
-        ],
-        check=True,
-    )
-    pdfpdf.unlink()
-    return [(page.page_idx, page.width, page.height) for page in pdf.pages]
+        page_sizes: PageSizes = [
+            (page.page_idx, page.width, page.height) for page in doc.pages
+        ]
+    if not page_sizes:
+        return []
+    return _commands(args, str(pdf), None, _split_spans([page_sizes], pieces))
 
 
-@_popple.register(Page)
-def _popple_page(
-    pdf: Page, tempdir: Path, args: List[str]
-) -> List[Tuple[int, float, float]]:
+def _popple_doc(pdf: Document, args: List[str], pieces: int) -> Commands:
+    page_sizes: PageSizes = [
+        (page.page_idx, page.width, page.height) for page in pdf.pages
+    ]
+    if not page_sizes:
+        return []
+    spans = _split_spans([page_sizes], pieces)
+    if len(spans) == 1:
+        pdfpdf, pdfdata = _source(pdf)
+    else:
+        # Don't send the whole PDF down a pipe for every span
+        pdfpdf, pdfdata = _materialize(pdf), None
+    return _commands(args, pdfpdf, pdfdata, spans)
+
+
+def _popple_page(pdf: Page, args: List[str], pieces: int) -> Commands:
     assert pdf.doc is not None  # bug in PLAYA-PDF, oops, it cannot be None
-    pdfpdf = tempdir / "pdf.pdf"
-    with open(pdfpdf, "wb") as outfh:
-        outfh.write(pdf.doc.buffer)
-    page_number = pdf.page_idx + 1
-    subprocess.run(
-        [
-            "pdftoppm",
-            *args,
-            "-f",
-            str(page_number),
-            "-l",
-            str(page_number),
-            str(pdfpdf),
-            tempdir / "ppm",
-        ],
-        check=True,
-    )
-    pdfpdf.unlink()
-    return [(pdf.page_idx, pdf.width, pdf.height)]
+    pdfpdf, pdfdata = _source(pdf.doc)
+    return _commands(args, pdfpdf, pdfdata, [[(pdf.page_idx, pdf.width, pdf.height)]])
 
 
-@_popple.register(PageList)
-def _popple_pages(
-    pdf: PageList, tempdir: Path, args: List[str]
-) -> List[Tuple[int, float, float]]:
-    pdfpdf = tempdir / "pdf.pdf"
+def _popple_pages(pdf: PageList, args: List[str], pieces: int) -> Commands:
     assert pdf[0].doc is not None  # bug in PLAYA-PDF, oops, it cannot be None
-    with open(pdfpdf, "wb") as outfh:
-        outfh.write(pdf[0].doc.buffer)
-    pages = sorted(page.page_idx + 1 for page in pdf)
-    itor = iter(pages)
-    first = last = next(itor)
-    spans = []
+    # pdftoppm will render them in order, so sort them
+    pages = sorted(
+        ((page.page_idx, page.width, page.height) for page in pdf),
+        key=operator.itemgetter(0),
+    )
+    first, last = pages[0][0], pages[-1][0]
+    spans: List[PageSizes] = []
+    if len(pages) >= COALESCE_DENSITY * (last - first + 1):
+        # Parsing the PDF again costs more than rendering a few extra pages
+        wanted = {page[0]: page for page in pages}
+        spans.append([wanted.get(idx) for idx in range(first, last + 1)])
+    else:
+        for page in pages:
+            prev = spans[-1][-1] if spans else None
+            if prev is not None and page[0] == prev[0] + 1:
+                spans[-1].append(page)
+            else:
+                spans.append([page])
+    spans = _split_spans(spans, pieces)
+    if len(spans) == 1:
+        pdfpdf, pdfdata = _source(pdf[0].doc)
+    else:
+        # Don't send the whole PDF down a pipe for every span
+        pdfpdf, pdfdata = _materialize(pdf[0].doc), None
+    return _commands(args, pdfpdf, pdfdata, spans)
+
+
+def _feed(stream: IO[bytes], data: Buffer) -> None:
+    try:
+        stream.write(data)
+        stream.close()
+    except (BrokenPipeError, ValueError):
+        # pdftoppm went away (or we killed it)
+        pass
+
+
+PREFETCH = 2
+"""Number of pages to read ahead of the caller from pdftoppm."""
+
+
+def _read_frames(stream: IO[bytes], frames: "queue.Queue[Frame]") -> None:
+    """Read images from pdftoppm as soon as they are ready, so that it
+    can go on rendering while the caller does something with them."""
     while True:
         try:
-            next_last = next(itor)
-        except StopIteration:
-            spans.append((first, last))
+            img = _read_pnm(stream)
+        except (ValueError, OSError) as e:
+            frames.put(e)
             break
-        if next_last > last + 1:
-            spans.append((first, last))
-            first = last = next_last
-        else:
-            last = next_last
-    assert PATH_TO_POPPLER is not None
-    for first, last in spans:
-        subprocess.run(
-            [
-                PATH_TO_POPPLER,
-                *args,
-                "-f",
-                str(first),
-                "-l",
-                str(last),
-                str(pdfpdf),
-                tempdir / "ppm",
-            ],
-            check=True,
+        frames.put(img)
+        if img is None:
+            break
+
+
+def _find_pdftoppm() -> str:
+    """Find pdftoppm, making sure (only once) that it actually runs."""
+    global _POPPLER_OK
+    if PATH_TO_POPPLER is not None and _POPPLER_OK is None:
+        try:
+            subprocess.run([PATH_TO_POPPLER, "-v"], capture_output=True)
+            _POPPLER_OK = True
+        except OSError:
+            _POPPLER_OK = False
+    if PATH_TO_POPPLER is None or not _POPPLER_OK:
+        raise NotInstalledError("Poppler does not seem to be installed")
+    return PATH_TO_POPPLER
+
+
+class _Pdftoppm:
+    """A running pdftoppm along with the thread reading its output.
+
+    It starts as soon as it is created, so that several of them can
+    render at the same time."""
+
+    def __init__(
+        self,
+        pdftoppm: str,
+        args: List[str],
+        pdfdata: Union[Buffer, None],
+        page_sizes: PageSizes,
+        prefetch: int = PREFETCH,
+    ) -> None:
+        self.page_sizes = page_sizes
+        self.proc = subprocess.Popen(
+            [pdftoppm, *args],
+            stdin=None if pdfdata is None else subprocess.PIPE,
+            stdout=subprocess.PIPE,
         )
-    pdfpdf.unlink()
-    return [(page.page_idx, page.width, page.height) for page in pdf]
+        assert self.proc.stdout is not None
+        if pdfdata is not None:
+            # Write from another thread so we don't deadlock on stdout
+            assert self.proc.stdin is not None
+            threading.Thread(
+                target=_feed, args=(self.proc.stdin, pdfdata), daemon=True
+            ).start()
+        self.frames: "queue.Queue[Frame]" = queue.Queue(maxsize=prefetch)
+        self.reader = threading.Thread(
+            target=_read_frames, args=(self.proc.stdout, self.frames), daemon=True
+        )
+        self.reader.start()
+
+    def __iter__(self) -> Iterator[Image.Image]:
+        """Read the images from pdftoppm's standard output."""
+        try:
+            for page in self.page_sizes:
+                img = self.frames.get()
+                if isinstance(img, Exception):
+                    raise img
+                if img is None:
+                    break
+                if page is None:  # rendered only to avoid reparsing the PDF
+                    continue
+                page_idx, page_width, page_height = page
+                img.info["page_index"] = page_idx
+                img.info["page_width"] = page_width
+                img.info["page_height"] = page_height
+                yield img
+            retcode = self.proc.wait()
+            if retcode:
+                raise subprocess.CalledProcessError(retcode, self.proc.args)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Stop pdftoppm if it is still running and clean up."""
+        # If we stopped early, don't wait for the rest of the pages
+        if self.proc.poll() is None:
+            self.proc.kill()
+        # Make sure the reader isn't stuck waiting for us
+        while self.reader.is_alive():
+            try:
+                self.frames.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        assert self.proc.stdout is not None
+        self.proc.stdout.close()
+        self.proc.wait()
 
 
 @converter(priority=10)
@@ -161,14 +395,23 @@ def popple(
     dpi: int = 0,
     width: int = 0,
     height: int = 0,
+    max_workers: int = 1,
 ) -> Iterator[Image.Image]:
     """Convert a PDF to images using Poppler's pdftoppm.
 
+    Optionally, the pages can be split into `max_workers` ranges
+    which are rendered in parallel by separate pdftoppm processes.
+    Each of these has to parse the whole PDF, so this is only worth
+    it for large documents.
+
     Args:
         pdf: PLAYA-PDF document, page, pages, or path to a PDF.
         dpi: Render to this resolution (default is 72 dpi).
         width: Render to this width in pixels.
         height: Render to this height in pixels.
+        max_workers: Number of pdftoppm processes to run at once
+            (default is 1, which renders everything with a single
+            pdftoppm where possible).
     Yields:
         Pillow `Image.Image` objects, one per page.
     Raises:
@@ -177,21 +420,27 @@ def popple(
     """
     if dpi and (width or height):
         raise ValueError("Cannot specify both `dpi` and `width` or `height`")
-    try:
-        subprocess.run(["pdftoppm", "-h"], capture_output=True)
-    except FileNotFoundError as e:
-        raise NotInstalledError("Poppler does not seem to be installed") from e
+    pdftoppm = _find_pdftoppm()
+    if max_workers < 1:
+        raise ValueError("`max_workers` must be at least 1")
     args = make_poppler_args(dpi, width, height)
-    with tempfile.TemporaryDirectory() as tempdir:
-        temppath = Path(tempdir)
-        # FIXME: Possible to Popple in a Parallel Pipeline
-        page_sizes = _popple(pdf, temppath, args)
-        for (page_idx, page_width, page_height), ppm in zip(
-            page_sizes,
-            (path for path in sorted(temppath.iterdir()) if path.suffix == ".ppm"),
-        ):
-            img = Image.open(ppm)
-            img.info["page_index"] = page_idx
-            img.info["page_width"] = page_width
-            img.info["page_height"] = page_height
-            yield img
+    if max_workers == 1:
+        for cmd_args, pdfdata, page_sizes in _popple(pdf, args):
+            yield from _Pdftoppm(pdftoppm, cmd_args, pdfdata, page_sizes)
+        return
+    # Each pdftoppm can render all of its pages without waiting for
+    # the caller, and we only run a few of them at a time
+    running: Deque[_Pdftoppm] = deque()
+    try:
+        for cmd_args, pdfdata, page_sizes in _popple(pdf, args, max_workers):
+            running.append(
+                _Pdftoppm(pdftoppm, cmd_args, pdfdata, page_sizes, len(page_sizes) + 1)
+            )
+            if len(running) < max_workers:
+                continue
+            yield from running.popleft()
+        while running:
+            yield from running.popleft()
+    finally:
+        for job in running:
+            job.close()
@@ -2,8 +2,9 @@
 Common interface for table detectors.
 """
 
+import bisect
 from os import PathLike
-from typing import Callable, Iterator, List, Protocol, Tuple, Union
+from typing import Callable, Dict, Iterator, List, Protocol, Tuple, Union
 from playa import Document, Page, PageList
 
 from paves.tables.table import TableObject
@@ -21,16 +22,22 @@ class Detector(Protocol):
 
 
 DETECTORS: List[Tuple[int, Detector]] = []
+_BY_NAME: Dict[str, Tuple[int, Detector]] = {}
+"""First detector (in order of priority) with each name."""
 
 
 def detector(*, priority: int) -> Callable[[Detector], Detector]:
     """Decorator to register detector functions with priorities."""
 
     def register(func: Detector) -> Detector:
-        DETECTORS.append((priority, func))
-        # We don't care about the inefficiency of this as there are
-        # only ever going to be a few of them
-        DETECTORS.sort()
+        # Insert after any others with the same priority (bisect has
+        # no `key` before Python 3.10, and functions don't compare)
+        idx = bisect.bisect_right([p for p, _ in DETECTORS], priority)
+        DETECTORS.insert(idx, (priority, func))
+        # Keep the one that comes first, as tables_orelse would
+        found = _BY_NAME.get(func.__name__)
+        if found is None or priority < found[0]:
+            _BY_NAME[func.__name__] = (priority, func)
         return func
 
     return register
@@ -38,10 +45,10 @@ def detector(*, priority: int) -> Callable[[Detector], Detector]:
 
 def lookup(name: str) -> Union[Detector, None]:
     """Look up a detector by name."""
-    for _, d in DETECTORS:
-        if d.__name__ == name:
-            return d
-    return None
+    found = _BY_NAME.get(name)
+    if found is None:
+        return None
+    return found[1]
 
 
 def tables_orelse(
@@ -3,10 +3,14 @@ Detect tables using RT-DETR models from IBM Docling project, or
 Microsoft Table Transformer (which is also DETR).
 """
 
+import contextlib
+import importlib.util
+import itertools
 import logging
-from functools import singledispatch
+import sys
+from functools import lru_cache, singledispatch
 from os import PathLike
-from typing import Any, Iterator, List, Tuple, Union
+from typing import Any, Callable, ContextManager, Iterator, List, Tuple, Union
 
 import paves.image as pi
 import playa
@@ -18,17 +22,10 @@ LOGGER = logging.getLogger(__name__)
 
 
 @singledispatch
-def _get_pages(pdf: Union[str, PathLike, Document, Page, PageList]) -> Iterator[Page]:
+def _get_pages(pdf: Union[Document, Page, PageList]) -> Iterator[Page]:
     raise NotImplementedError
 
 
-@_get_pages.register(str)
-@_get_pages.register(PathLike)
-def _get_pages_path(pdf: Union[str, PathLike]) -> Iterator[Page]:
-    with playa.open(pdf) as doc:
-        yield from doc.pages
-
-
 @_get_pages.register
 def _get_pages_pagelist(pagelist: PageList) -> Iterator[Page]:
     yield from pagelist
@@ -44,12 +41,73 @@ def _get_pages_page(page: Page) -> Iterator[Page]:
     yield page
 
 
-def make_rect(box: List[Union[int, float]]) -> Rect:
-    """Verify and create a bounding box as tuple of ints."""
-    rect = tuple(round(x) for x in box)
-    if len(rect) != 4:
-        raise TypeError(f"Rectangle does not have 4 corners: {box}")
-    return rect
+@lru_cache(maxsize=None)
+def _have_models() -> bool:
+    """Check for PyTorch and Transformers without importing them."""
+    return all(
+        importlib.util.find_spec(name) is not None for name in ("torch", "transformers")
+    )
+
+
+def _from_pretrained(cls: Any, model_name: str, **kwargs: Any) -> Any:
+    """Load from the local cache if we can, without asking the Hub
+    whether there is anything new."""
+    if "local_files_only" not in kwargs:
+        try:
+            return cls.from_pretrained(model_name, local_files_only=True, **kwargs)
+        except OSError:  # not downloaded yet
+            pass
+    return cls.from_pretrained(model_name, **kwargs)
+
+
+@lru_cache(maxsize=4)
+def _load_model(
+    model_name: str,
+    device: str,
+    model_kwargs: Tuple[Tuple[str, Any], ...],
+    compile_model: bool = False,
+    quantize: bool = False,
+) -> Tuple[Any, Any]:
+    """Load a processor and model only once, since that is slow."""
+    import torch
+    from transformers import AutoImageProcessor, AutoModelForObjectDetection
+
+    processor = _from_pretrained(AutoImageProcessor, model_name, use_fast=True)
+    model = _from_pretrained(
+        AutoModelForObjectDetection, model_name, **dict(model_kwargs)
+    ).to(device)
+    if device == "cuda":
+        # Convolutions on the GPU are faster with channels last (NHWC)
+        model = model.to(memory_format=torch.channels_last)
+    if quantize and device == "cpu":
+        # Use int8 matrix multiplication for the transformer layers
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    if compile_model:
+        # The input size is fixed, so the compiled graph can be reused
+        # (and on a GPU, replayed with CUDA graphs)
+        model = torch.compile(
+            model,
+            mode="reduce-overhead" if device == "cuda" else None,
+            dynamic=False,
+        )
+    return processor, model
+
+
+def unload_models() -> None:
+    """Forget about all loaded detection models, freeing their memory.
+
+    Models are kept around (a few at a time) after detecting objects,
+    which avoids loading them again, but uses a lot of memory, notably
+    on the GPU.  Any detection still in progress keeps its model until
+    it is done.
+    """
+    _load_model.cache_clear()
+    # Don't import it just to do this
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
 
 
 def detect_objects(
@@ -58,19 +116,42 @@ def detect_objects(
     *,
     model_kwargs: dict[str, Any] | None = None,
     threshold: float = 0.5,
+    batch_size: int = 4,
+    compile_model: bool = False,
+    quantize: bool = False,
 ) -> Iterator[Tuple[int, List[Tuple[str, Rect]]]]:
-    """Iterate over all text objects in a PDF, page, or pages"""
+    """Iterate over all text objects in a PDF, page, or pages
+
+    Pages are run through the model `batch_size` at a time.  Use a
+    smaller `batch_size` (e.g. 1) if this runs out of memory.
+
+    With `compile_model`, the model is compiled with `torch.compile`
+    the first time it is loaded.  This takes a while, so it is only
+    worth it for lots of pages.
+
+    With `quantize`, the linear layers of the model are quantized to
+    int8 when running on the CPU, which is faster, but may find
+    slightly different boxes.  On a GPU, the model always runs in half
+    precision.
+    """
+    if batch_size < 1:
+        raise ValueError("`batch_size` must be at least 1")
     import torch
-    from transformers import AutoImageProcessor, AutoModelForObjectDetection
 
-    processor = AutoImageProcessor.from_pretrained(model_name, use_fast=True)
     # FIXME: sorry, AMD owners, and everybody else, this will get fixed
     device = "cuda" if torch.cuda.is_available() else "cpu"
     torch_device = torch.device(device)
     if model_kwargs is None:
         model_kwargs = {}
-    model = AutoModelForObjectDetection.from_pretrained(model_name, **model_kwargs).to(
-        torch_device
+    model_key = tuple(sorted(model_kwargs.items()))
+    load_model: Callable[..., Tuple[Any, Any]]
+    try:
+        hash(model_key)
+        load_model = _load_model
+    except TypeError:  # e.g. a dict of options, so it can't be cached
+        load_model = _load_model.__wrapped__
+    processor, model = load_model(
+        model_name, device, model_key, compile_model, quantize
     )
 
     # Concoct some arguments for pi.convert (FIXME: should be able to
@@ -86,22 +167,113 @@ def detect_objects(
         # Render it big and let the model figure it out
         dpi = 144
 
-    # We could do this in a batch, but that easily runs out of memory
+    if torch_device.type == "cuda":
+        # Half precision is plenty for finding boxes, and much faster
+        autocast: ContextManager[Any] = torch.autocast("cuda", dtype=torch.float16)
+    else:
+        autocast = contextlib.nullcontext()
+    # Fast (torchvision) image processors can do their work on the GPU
+    try:
+        from transformers.image_processing_utils_fast import BaseImageProcessorFast
+
+        on_device = torch_device.type == "cuda" and isinstance(
+            processor, BaseImageProcessorFast
+        )
+    except ImportError:  # older transformers
+        on_device = False
+    images = pi.convert(pdf, dpi=dpi, width=width, height=height)
+    pending: Union[Tuple[List[Tuple[int, float, float]], Any], None] = None
     with torch.inference_mode():
-        for image in pi.convert(pdf, dpi=dpi, width=width, height=height):
-            inputs = processor(images=[image], return_tensors="pt").to(torch_device)
-            outputs = model(**inputs)
-            results = processor.post_process_object_detection(
-                outputs,
-                target_sizes=[(image.info["page_height"], image.info["page_width"])],
-                threshold=threshold,
-            )
-            boxes: List[Tuple[str, Rect]] = []
-            for label, box in zip(results[0]["labels"], results[0]["boxes"]):
-                name = model.config.id2label[label.item()]
-                bbox = make_rect(box.tolist())
-                boxes.append((name, bbox))
-            yield image.info["page_index"], boxes
+        while True:
+            batch = list(itertools.islice(images, batch_size))
+            if batch:
+                if on_device:
+                    # Send the pixels to the GPU as bytes and rescale
+                    # and normalize them there
+                    inputs = processor(
+                        images=batch, return_tensors="pt", device=torch_device
+                    )
+                else:
+                    inputs = processor(images=batch, return_tensors="pt")
+                    if torch_device.type == "cuda":
+                        # Copy from pinned memory so that we don't wait
+                        inputs = {
+                            name: value.pin_memory().to(torch_device, non_blocking=True)
+                            for name, value in inputs.items()
+                        }
+                    else:
+                        inputs = inputs.to(torch_device)
+                if torch_device.type == "cuda":
+                    # Same memory layout as the model (see _load_model)
+                    inputs["pixel_values"] = inputs["pixel_values"].to(
+                        memory_format=torch.channels_last
+                    )
+                # On a GPU this returns before the model is done, so
+                # render the next batch while it runs
+                with autocast:
+                    outputs = model(**inputs)
+                # Only the outputs are needed from here on
+                del inputs
+            if pending is not None:
+                yield from _detections(model, processor, *pending, threshold)
+            if not batch:
+                break
+            # Only the page information is needed from here on, so
+            # don't keep the images around while rendering the next batch
+            pending = [
+                (
+                    image.info["page_index"],
+                    image.info["page_width"],
+                    image.info["page_height"],
+                )
+                for image in batch
+            ], outputs
+            del batch
+
+
+def _detections(
+    model: Any,
+    processor: Any,
+    pages: List[Tuple[int, float, float]],
+    outputs: Any,
+    threshold: float,
+) -> Iterator[Tuple[int, List[Tuple[str, Rect]]]]:
+    results = processor.post_process_object_detection(
+        outputs,
+        target_sizes=[(height, width) for _, width, height in pages],
+        threshold=threshold,
+    )
+    id2label = model.config.id2label
+    for (page_idx, _, _), result in zip(pages, results):
+        # Get everything off the device at once and not box by box
+        labels = result["labels"].tolist()
+        coords = result["boxes"].round().long().tolist()
+        boxes: List[Tuple[str, Rect]] = [
+            (id2label[label], (x0, y0, x1, y1))
+            for label, (x0, y0, x1, y1) in zip(labels, coords)
+        ]
+        yield page_idx, boxes
+
+
+def _detected_tables(
+    pdf: Union[str, PathLike, Document, Page, PageList],
+    label: Union[str, None],
+    model_name: str,
+    **kwargs: Any,
+) -> Iterator[TableObject]:
+    """Make TableObjects from objects detected with `label` (or all of
+    them, if it is `None`)."""
+    if isinstance(pdf, (str, PathLike)):
+        # Open it only once, for both the pages and the rendering
+        with playa.open(pdf) as doc:
+            yield from _detected_tables(doc, label, model_name, **kwargs)
+        return
+    detected = detect_objects(pdf, model_name, **kwargs)
+    for page, (page_idx, objects) in zip(_get_pages(pdf), detected):
+        assert page.page_idx == page_idx
+        for name, bbox in objects:
+            if label is None or name == label:
+                yield TableObject.from_bbox(page, bbox)
 
 
 @detector(priority=10)
@@ -118,19 +290,10 @@ def docling_heron(
       An iterator over `TableObject`, or `None`, if the model can't be used
 
     """
-    try:
-        detected = detect_objects(pdf, "docling-project/docling-layout-heron")
-    except ImportError:
+    # Don't load the model (or even import torch) until we need it
+    if not _have_models():
         return None
-
-    def itor() -> Iterator[TableObject]:
-        for page, (page_idx, objects) in zip(_get_pages(pdf), detected):
-            assert page.page_idx == page_idx
-            for label, bbox in objects:
-                if label == "Table":
-                    yield TableObject.from_bbox(page, bbox)
-
-    return itor()
+    return _detected_tables(pdf, "Table", "docling-project/docling-layout-heron")
 
 
 @detector(priority=20)
@@ -147,20 +310,12 @@ def table_transformer(
       An iterator over `TableObject`, or `None`, if the model can't be used
 
     """
-    try:
-        detected = detect_objects(
-            pdf,
-            "microsoft/table-transformer-detection",
-            model_kwargs={"revision": "no_timm"},
-            threshold=0.9,
-        )
-    except ImportError:
+    if not _have_models():
         return None
-
-    def itor() -> Iterator[TableObject]:
-        for page, (page_idx, objects) in zip(_get_pages(pdf), detected):
-            assert page.page_idx == page_idx
-            for label, bbox in objects:
-                yield TableObject.from_bbox(page, bbox)
-
-    return itor()
+    return _detected_tables(
+        pdf,
+        None,
+        "microsoft/table-transformer-detection",
+        model_kwargs={"revision": "no_timm"},
+        threshold=0.9,
+    )
@@ -2,9 +2,10 @@
 Table detection using PDF logical structure.
 """
 
+import weakref
 from functools import singledispatch
 from itertools import groupby
-from typing import Iterable, Iterator, Union
+from typing import Dict, Iterable, Iterator, Tuple, Union
 from operator import attrgetter
 from os import PathLike
 
@@ -12,6 +13,7 @@ import playa
 from playa import Document, Page, PageList
 from playa.structure import (
     Element,
+    Tree,
 )
 
 from paves.tables.detectors import detector
@@ -35,12 +37,30 @@ def table_elements_path(pdf: Union[str, PathLike]) -> Iterator[Element]:
         yield from table_elements_doc(doc)
 
 
+_DOC_TABLES: Dict[int, Tuple[Element, ...]] = {}
+"""Table elements of documents, keyed by `id` of the document."""
+
+
+def _find_tables(pdf: Document, structure: Tree) -> Iterator[Element]:
+    found = []
+    for el in structure.find_all("Table"):
+        found.append(el)
+        yield el
+    # Only remember them if we got to the end
+    _DOC_TABLES[id(pdf)] = tuple(found)
+    weakref.finalize(pdf, _DOC_TABLES.pop, id(pdf), None)
+
+
 @table_elements.register
 def table_elements_doc(pdf: Document) -> Iterator[Element]:
+    tables = _DOC_TABLES.get(id(pdf))
+    if tables is not None:
+        return iter(tables)
     structure = pdf.structure
     if structure is None:
         raise TypeError("Document has no logical structure")
-    return structure.find_all("Table")
+    # Searching the whole structure tree is slow, so do it only once
+    return _find_tables(pdf, structure)
 
 
 @table_elements.register
@@ -65,16 +85,19 @@ def table_elements_to_objects(
     elements: Iterable[Element], page: Union[Page, None] = None
 ) -> Iterator[TableObject]:
     """Make TableObjects from Elements."""
+    # Avoid looking these up again for every element
+    from_element = TableObject.from_element
+    get_page = attrgetter("page")
     for el in elements:
         # It usually has a page, but it can also span multiple pages
         # if this is the case.  So a page passed explicitly here
         # should take precedence.
-        for kidpage, kids in groupby(el.contents, attrgetter("page")):
+        for kidpage, kids in groupby(el.contents, get_page):
             if kidpage is None:
                 continue
             if page is not None and kidpage is not page:
                 continue
-            table = TableObject.from_element(el, kidpage, kids)
+            table = from_element(el, kidpage, kids)
             if table is not None:
                 yield table
 
@@ -2,7 +2,6 @@
 Table types.
 """
 
-from copy import copy
 from typing import Iterable, Iterator, Tuple, Union
 
 from playa import Page
@@ -20,6 +19,28 @@ from dataclasses import dataclass
 from playa.content import ContentObject
 from playa.utils import get_bound_rects
 
+KidInfo = Tuple[GraphicState, Matrix, Tuple[MarkedContent, ...], Union[Rect, None]]
+
+
+def _from_struct(kid: StructContentObject) -> Union[KidInfo, None]:
+    obj = kid.obj
+    if obj is None:
+        return None
+    elif isinstance(obj, Annotation):
+        # FIXME: for the moment just ignore these
+        return None
+    # We stopped interpreting the page, so its gstate will not change
+    return obj.gstate, obj.ctm, obj.mcstack, obj.bbox
+
+
+def _from_item(kid: ContentItem) -> Union[KidInfo, None]:
+    try:
+        cobj = next(iter(kid))
+    except StopIteration:
+        return None
+    # Marked content is already finalized, so no need to copy it
+    return cobj.gstate, cobj.ctm, cobj.mcstack, None
+
 
 @dataclass
 class TableObject(ContentObject):
@@ -59,13 +80,17 @@ class TableObject(ContentObject):
             if self._parent.page is self.page:
                 bbox = self._parent.bbox
                 if bbox is not None:
+                    self._bbox = bbox
                     return bbox
             # We always have a page even if self._parent doesn't
-            return get_bound_rects(
+            page = self.page
+            # This means looking at all the contents, so only do it once
+            self._bbox = get_bound_rects(
                 item.bbox
                 for item in self._parent.contents
-                if item.page is self.page and item.bbox is not None
+                if item.page is page and item.bbox is not None
             )
+            return self._bbox
         else:
             # This however should never happen
             return None
@@ -100,30 +125,15 @@ class TableObject(ContentObject):
         bbox: Union[Rect, None] = None
         for kid in contents:
             # For multi-page tables, skip any contents on a different page
-            if kid.page != page:
+            if kid.page is not page:
                 continue
+            found: Union[KidInfo, None] = None
             if isinstance(kid, StructContentObject):
-                obj = kid.obj
-                if obj is None:
-                    continue
-                elif isinstance(obj, Annotation):
-                    # FIXME: for the moment just ignore these
-                    continue
-                else:
-                    gstate = copy(obj.gstate)
-                    ctm = obj.ctm
-                    mcstack = obj.mcstack
-                    bbox = obj.bbox
-                    break
+                found = _from_struct(kid)
             elif isinstance(kid, ContentItem):
-                # It's a ContentItem
-                try:
-                    cobj = next(iter(kid))
-                except StopIteration:
-                    continue
-                gstate = copy(cobj.gstate)
-                ctm = cobj.ctm
-                mcstack = cobj.mcstack
+                found = _from_item(kid)
+            if found is not None:
+                gstate, ctm, mcstack, bbox = found
                 break
         else:
             # No contents, no table for you!
@@ -4,13 +4,20 @@ processing text in PDFs.
 """
 
 import operator
+from copy import copy
 from dataclasses import dataclass
 from functools import singledispatch
 from os import PathLike
-from typing import Iterator, List, Union, cast
+from typing import Iterator, List, Tuple, Union
 
 import playa
-from playa.content import ContentObject, GlyphObject, TextBase, TextObject
+from playa.content import (
+    ContentObject,
+    GlyphObject,
+    GraphicState,
+    TextBase,
+    TextObject,
+)
 from playa.document import Document, PageList
 from playa.page import Page
 from playa.pdftypes import Point, Matrix
@@ -44,7 +51,7 @@ class WordObject(TextBase):
     use `itertools.groupby(words, paves.text.line)`)
     """
 
-    _glyphs: List[GlyphObject]
+    _glyphs: Tuple[GlyphObject, ...]
     _next_origin: Point
     line: Point
 
@@ -139,10 +146,6 @@ def text_objects_page(page: Page) -> Iterator[TextObject]:
     return page.texts
 
 
-def _add_point(a: Point, b: Point) -> Point:
-    return a[0] + b[0], a[1] + b[1]
-
-
 def words(
     pdf: Union[str, PathLike, Document, Page, PageList],
 ) -> Iterator[WordObject]:
@@ -161,12 +164,41 @@ def words(
     prev_disp: Union[None, Point] = None
     line_origin: Union[None, Point] = None
     for obj in text_objects(pdf):
+        # These are the same for every glyph in a text object, so
+        # don't look them up (through several properties) for each one
+        font = obj.gstate.font
+        vertical = font is not None and font.vertical
+        screen = obj.page.space == "screen"
+        # Glyphs share the graphics state of their text object, so
+        # they can all be finalized with the same copy of it
+        gstate: Union[None, GraphicState] = None
         for glyph in obj:
+            text = glyph.text
+            # Same as glyph.origin, and glyph.displacement below
+            a, b, c, d, x, y = glyph.matrix
+            origin = x, y
             if line_origin is None:
-                line_origin = glyph.origin
-            if predicted_origin and prev_disp:
-                new_word = word_break(glyph, predicted_origin, prev_disp)
-                new_line = line_break(glyph, predicted_origin)
+                line_origin = origin
+            if predicted_origin is not None and prev_disp is not None:
+                # Same as word_break() and line_break(), but inline
+                px, py = predicted_origin
+                if vertical:
+                    glyph_offset = y - py
+                    _, displacement = prev_disp
+                    if screen:
+                        glyph_offset = -glyph_offset
+                        displacement = -displacement
+                    line_offset = x - px
+                else:
+                    glyph_offset = x - px
+                    displacement, _ = prev_disp
+                    line_offset = y - py
+                    if screen:
+                        line_offset = -line_offset
+                new_word = (
+                    text == " " or glyph_offset > 0.5 or glyph_offset < -displacement
+                )
+                new_line = line_offset < 0 or line_offset > 100  # FIXME: arbitrary!
                 if glyphs and (new_word or new_line):
                     yield WordObject(
                         _pageref=glyphs[0]._pageref,
@@ -174,17 +206,24 @@ def words(
                         gstate=glyphs[0].gstate,  # Not necessarily correct!
                         ctm=glyphs[0].ctm,  # Not necessarily correct!
                         mcstack=glyphs[0].mcstack,  # Not necessarily correct!
-                        _glyphs=glyphs,
+                        _glyphs=tuple(glyphs),
                         _next_origin=predicted_origin,
                         line=line_origin,
                     )
-                    glyphs = []
+                    glyphs.clear()
                 if new_line:
-                    line_origin = glyph.origin
-            if glyph.text is not None and glyph.text != " ":
-                glyphs.append(cast(GlyphObject, glyph.finalize()))
-            prev_disp = glyph.displacement
-            predicted_origin = _add_point(glyph.origin, prev_disp)
+                    line_origin = origin
+            if text is not None and text != " ":
+                if gstate is None:
+                    gstate = copy(obj.gstate)
+                glyph.gstate = gstate
+                glyphs.append(glyph)
+            scale = glyph._displacement
+            if vertical:
+                prev_disp = c * scale, d * scale
+            else:
+                prev_disp = a * scale, b * scale
+            predicted_origin = x + prev_disp[0], y + prev_disp[1]
     if predicted_origin and line_origin and glyphs:
         yield WordObject(
             _pageref=glyphs[0]._pageref,
@@ -192,7 +231,7 @@ def words(
             gstate=glyphs[0].gstate,  # Not necessarily correct!
             ctm=glyphs[0].ctm,  # Not necessarily correct!
             mcstack=glyphs[0].mcstack,  # Not necessarily correct!
-            _glyphs=glyphs,
+            _glyphs=tuple(glyphs),
             _next_origin=predicted_origin,
             line=line_origin,
         )
@@ -2,15 +2,28 @@ from typing import Callable, Iterator, Tuple, Union
 
 from PIL import Image
 
+from . import raw as raw
+
 class PdfBitmap:
+    @classmethod
+    def new_native(
+        cls,
+        width: int,
+        height: int,
+        format: int,
+        rev_byteorder: bool = ...,
+        buffer=...,
+        stride: Union[int, None] = ...,
+    ) -> "PdfBitmap": ...
     def to_pil(self) -> Image.Image: ...
+    def close(self) -> None: ...
 
 class PdfColorScheme:
     pass
 
 class PdfPage:
-    def get_width(self) -> int: ...
-    def get_height(self) -> int: ...
+    def get_width(self) -> float: ...
+    def get_height(self) -> float: ...
     def render(
         self,
         scale: float = ...,
@@ -27,5 +40,6 @@ class PdfPage:
 class PdfDocument:
     def __init__(self, input, password=None, autoclose=False) -> None: ...
     def __iter__(self) -> Iterator[PdfPage]: ...
+    def __len__(self) -> int: ...
     def __getitem__(self, idx: int) -> PdfPage: ...
     def close(self) -> None: ...
@@ -0,0 +1 @@
+FPDFBitmap_BGR: int
@@ -3,6 +3,7 @@ from dataclasses import dataclass
 from pathlib import Path
 
 import pytest
+from PIL import Image
 
 import playa
 import paves.image as pi
@@ -41,6 +42,10 @@ def test_popple() -> None:
         assert len(images) == 1
         assert all("page_width" in image.info for image in images)
         assert [image.info["page_index"] for image in images] == [1]
+        serial = list(pi.popple(pdf.pages[[3, 4, 5, 9, 10]], max_workers=1))
+        parallel = list(pi.popple(pdf.pages[[3, 4, 5, 9, 10]], max_workers=2))
+        assert [image.info["page_index"] for image in parallel] == [3, 4, 5, 9, 10]
+        assert [image.size for image in serial] == [image.size for image in parallel]
 
 
 def test_pdfium() -> None:
@@ -70,6 +75,108 @@ def test_pdfium() -> None:
         assert len(images) == 1
         assert all("page_width" in image.info for image in images)
         assert [image.info["page_index"] for image in images] == [1]
+        serial = list(pi.pdfium(pdf.pages[[3, 4, 5, 9, 10]], max_workers=1))
+        parallel = list(
+            pi.pdfium(pdf.pages[[3, 4, 5, 9, 10]], max_workers=2, pages_per_worker=2)
+        )
+        assert [image.size for image in serial] == [image.size for image in parallel]
+
+
+def test_pdfium_exact_aspect() -> None:
+    path = THISDIR / "contrib" / "PSC_Station.pdf"
+    with playa.open(path) as pdf:
+        page = pdf.pages[0]
+        # By default, render to the longer side and shrink the other
+        exact = next(pi.pdfium(page, width=300, height=300))
+        wide = next(pi.pdfium(page, width=300))
+        assert wide.size[1] > 300
+        assert exact.size == (300, 300)
+        assert exact == wide.resize((300, 300), Image.Resampling.BICUBIC)
+        # Or render to the shorter side and stretch the other
+        fast = next(pi.pdfium(page, width=300, height=300, exact_aspect=False))
+        tall = next(pi.pdfium(page, height=300))
+        assert tall.size[0] < 300
+        assert fast.size == (300, 300)
+        assert fast == tall.resize((300, 300), Image.Resampling.BICUBIC)
+
+
+def test_pdfium_batch() -> None:
+    numpy = pytest.importorskip("numpy")
+    path = THISDIR / "contrib" / "PSC_Station.pdf"
+    with playa.open(path) as pdf:
+        batch = pi.pdfium_batch(pdf.pages[[3, 4, 5]], dpi=50)
+        images = list(pi.pdfium(pdf.pages[[3, 4, 5]], dpi=50, max_workers=1))
+        assert batch.shape == (3, images[0].height, images[0].width, 3)
+        assert (batch == numpy.stack([numpy.asarray(img) for img in images])).all()
+        batch = pi.pdfium_batch(pdf, width=100, height=100)
+        assert batch.shape == (len(pdf.pages), 100, 100, 3)
+
+
+def test_pdfium_batch_sizes() -> None:
+    pytest.importorskip("numpy")
+    path = THISDIR / "contrib" / "PSC_Station.pdf"
+    with playa.open(path) as pdf:
+        # Some of these don't round-trip through the scale exactly
+        for size in range(1, 200):
+            batch = pi.pdfium_batch(pdf.pages[[0, 1]], width=size)
+            assert batch.shape[2] == size
+            batch = pi.pdfium_batch(pdf.pages[[0, 1]], height=size)
+            assert batch.shape[1] == size
+
+
+def test_document_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    from paves.image.converters import document_file
+
+    path = tmp_path / "station.pdf"
+    path.write_bytes((THISDIR / "contrib" / "PSC_Station.pdf").read_bytes())
+    monkeypatch.chdir(tmp_path)
+    with playa.open("station.pdf") as pdf:
+        assert document_file(pdf) == str(path)
+        # Still the same file after changing directory
+        monkeypatch.chdir(THISDIR)
+        assert document_file(pdf) == str(path)
+        # But not once it has been replaced by another one
+        other = tmp_path / "other.pdf"
+        other.write_bytes(path.read_bytes())
+        other.replace(path)
+        assert document_file(pdf) is None
+        # So we render from memory instead
+        assert pi.show(pdf.pages[0])
+
+
+def test_pdfium_cache_clear() -> None:
+    path = THISDIR / "contrib" / "PSC_Station.pdf"
+    with playa.open(path) as pdf:
+        before = next(pi.pdfium(pdf.pages[0]))
+        pi.pdfium_cache_clear()
+        # It gets opened again
+        after = next(pi.pdfium(pdf.pages[0]))
+        assert before == after
+
+
+def test_show_cache() -> None:
+    path = THISDIR / "contrib" / "PSC_Station.pdf"
+    with playa.open(path) as pdf:
+        page = pdf.pages[0]
+        img = pi.show(page)
+        # Drawing on it doesn't change the cached image
+        img.paste((255, 0, 0), (0, 0, 10, 10))
+        assert pi.show(page) != img
+        cached = pi.show(page).getpixel((0, 0))
+        assert cached != (255, 0, 0)
+        shown = sys.modules["paves.image"]._SHOWN[id(pdf)]
+        assert list(shown) == [(0, 72)]
+        # The least recently shown page gets evicted
+        for idx in range(1, pi.SHOW_CACHE_SIZE):
+            pi.show(pdf.pages[idx])
+        pi.show(page)
+        pi.show(pdf.pages[pi.SHOW_CACHE_SIZE])
+        assert len(shown) == pi.SHOW_CACHE_SIZE
+        assert (1, 72) not in shown
+        assert (0, 72) in shown
+        pi.show_cache_clear()
+        assert not shown
+        assert pi.show(page).getpixel((0, 0)) == cached
 
 
 def test_box() -> None:
@@ -78,6 +185,8 @@ def test_box() -> None:
         page = pdf.pages[0]
         img = pi.box(page)
         assert img
+        assert pi.show(page) is not pi.show(page)
+        assert pi.show(page) != img
         img = pi.box(page, color="red")
         assert img
         img = pi.box(page, color=["green", "orange", "purple"])
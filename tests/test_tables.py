@@ -1,7 +1,10 @@
 from pathlib import Path
 
+import pytest
+
 import playa
 import paves.tables as pb
+from paves.tables import detectors
 
 THISDIR = Path(__file__).parent
 
@@ -35,3 +38,26 @@ def test_multi_page_tables() -> None:
         assert table1.page == pdf.pages[0]
         assert table2.page == pdf.pages[1]
         assert table1.bbox != table2.bbox
+
+
+def test_detector_priority(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(detectors, "DETECTORS", [])
+    monkeypatch.setattr(detectors, "_BY_NAME", {})
+
+    def make(name: str):
+        def detect(pdf):
+            return None
+
+        detect.__name__ = name
+        return detect
+
+    first = detectors.detector(priority=10)(make("same"))
+    second = detectors.detector(priority=10)(make("other"))
+    third = detectors.detector(priority=20)(make("same"))
+    zeroth = detectors.detector(priority=5)(make("zeroth"))
+    # Equal priorities stay in the order they were registered
+    assert [func for _, func in detectors.DETECTORS] == [zeroth, first, second, third]
+    # And lookup finds the first one with a given name
+    assert pb.detector("same") is first
+    assert pb.detector("other") is second
+    assert pb.detector("nothing") is None